@@ -1,32 +1,82 @@
+import hashlib
 import logging
 import os
 import re
-from typing import Iterable, Tuple
+import threading
+from collections import Counter, OrderedDict
+from typing import List, NamedTuple, Optional, Tuple
 
 # Silence HuggingFace logging (model-load reports, weight tables, etc.)
 os.environ["TOKENIZERS_PARALLELISM"] = "false"
 os.environ["TRANSFORMERS_NO_ADVISORY_WARNINGS"] = "1"
 os.environ["HF_HUB_DISABLE_PROGRESS_BARS"] = "1"
-try:
-    import transformers as _tf
-    _tf.logging.set_verbosity_error()
-except Exception:
-    pass
+os.environ.setdefault("TRANSFORMERS_VERBOSITY", "error")
 logging.getLogger("transformers").setLevel(logging.ERROR)
 logging.getLogger("transformers.modeling_utils").setLevel(logging.ERROR)
 
+try:
+    from .utils import build_automaton, load_onnx_model, optimize_for_cpu, silence_transformers
+except ImportError:
+    from utils import build_automaton, load_onnx_model, optimize_for_cpu, silence_transformers  # type: ignore
+
+
 logger = logging.getLogger(__name__)
 
-_SPAM_PATTERNS: Iterable[re.Pattern] = [
-    re.compile(r"buy now", re.I),
-    re.compile(r"click here", re.I),
-    re.compile(r"free money", re.I),
-]
+_URL_RX = re.compile(r"https?://", re.I)
+_LINE_SPLIT_RX = re.compile(r"\n|\r")
+
+# obvious spammy phrases, unioned into one alternation (single scan)
+_SPAM_RX = re.compile(r"buy now|click here|free money", re.I)
 
 _TOXIC_WORDS = {"fuck", "shit", "bitch", "idiot", "kill", "hate"}
+_TOXIC_RX = re.compile(r"\b(?:" + "|".join(sorted(_TOXIC_WORDS)) + r")\b", re.I)
+
+# self-harm, threats, PII and explicit content (matched on lowercased text)
+_UNSAFE_PHRASES = (
+    "i will kill", "i'm going to kill", "i'm going to hurt",
+    "suicide", "kill myself", "end my life",
+    "contact me at", "my ssn", "credit card",
+    "nude", "sex with",
+)
+_UNSAFE_RX = re.compile(r"\b(?:" + "|".join(map(re.escape, _UNSAFE_PHRASES)) + r")\b")
+
+
+# With pyahocorasick all phrases are scanned in one pass; regex otherwise.
+_TOXIC_AC = build_automaton(_TOXIC_WORDS)
+_UNSAFE_AC = build_automaton(_UNSAFE_PHRASES)
+
+
+def _is_word_char(ch: str) -> bool:
+    return ch.isalnum() or ch == "_"
+
+
+def _find_whole_word(automaton, low: str) -> Optional[str]:
+    """Return the first automaton match in *low* that sits on word boundaries."""
+    for end, word in automaton.iter(low):
+        start = end - len(word) + 1
+        if start > 0 and _is_word_char(low[start - 1]):
+            continue
+        if end + 1 < len(low) and _is_word_char(low[end + 1]):
+            continue
+        return word
+    return None
+
+
+def _has_toxic_word(text: str) -> bool:
+    if _TOXIC_AC is not None:
+        return _find_whole_word(_TOXIC_AC, text.lower()) is not None
+    return bool(_TOXIC_RX.search(text))
+
+
+def _find_unsafe_phrase(low: str) -> Optional[str]:
+    if _UNSAFE_AC is not None:
+        return _find_whole_word(_UNSAFE_AC, low)
+    m = _UNSAFE_RX.search(low)
+    return m.group(0) if m else None
 
-# Transformers toxicity model (lazy-loaded)
-_TOXICITY_MODEL = "unitary/toxic-bert"
+# Transformers toxicity model (lazy-loaded). Override with a smaller
+# classifier that uses the same label names via HANGHIVE_TOXICITY_MODEL.
+_TOXICITY_MODEL = os.environ.get("HANGHIVE_TOXICITY_MODEL", "unitary/toxic-bert")
 _toxicity_detector = None
 
 
@@ -36,9 +86,16 @@ def _get_toxicity_detector():
         return _toxicity_detector
 
     try:
-        from transformers import pipeline
-
-        _toxicity_detector = pipeline("text-classification", model=_TOXICITY_MODEL, device=-1)
+        silence_transformers()
+        from transformers import AutoModelForSequenceClassification, AutoTokenizer
+
+        tokenizer = AutoTokenizer.from_pretrained(_TOXICITY_MODEL)
+        # prefer an ONNX Runtime export (already int8) when one is available
+        model = load_onnx_model(_TOXICITY_MODEL, "ORTModelForSequenceClassification")
+        if model is None:
+            model = AutoModelForSequenceClassification.from_pretrained(_TOXICITY_MODEL)
+            model = optimize_for_cpu(model.eval())
+        _toxicity_detector = (tokenizer, model)
         return _toxicity_detector
     except Exception as exc:
         _toxicity_detector = None
@@ -56,7 +113,86 @@ def warm_up_automod() -> bool:
 
 
 def _contains_url(text: str) -> bool:
-    return bool(re.search(r"https?://", text, re.I))
+    return bool(_URL_RX.search(text))
+
+
+# One zero-width scan over the text records where each feature starts:
+# links, @mentions and spam phrases.
+_SCAN_RX = re.compile(
+    r"(?=(?P<url>(?i:https?://))"
+    r"|(?P<mention>@\w)"
+    r"|(?P<spam>(?i:" + _SPAM_RX.pattern + r")))"
+)
+# Runs of a repeated character are matched separately with a consuming
+# pattern: inside the lookahead each run would be re-matched from every
+# one of its positions, which is quadratic in the run length.
+_REPEAT_RX = re.compile(r"(.)\1{4,}")
+
+
+class _TextScan(NamedTuple):
+    urls: int
+    mentions: int
+    spam_phrases: int
+    longest_repeat: int
+
+
+def _scan_text(text: str) -> _TextScan:
+    """Count links, mentions, spam phrases and the longest character run."""
+    urls = mentions = spam_phrases = 0
+    for m in _SCAN_RX.finditer(text):
+        kind = m.lastgroup
+        if kind == "url":
+            urls += 1
+        elif kind == "mention":
+            mentions += 1
+        else:
+            spam_phrases += 1
+    longest_repeat = max((len(m.group(0)) for m in _REPEAT_RX.finditer(text)), default=0)
+    return _TextScan(urls, mentions, spam_phrases, longest_repeat)
+
+
+class _VerdictCache:
+    """Thread-safe bounded LRU mapping message digests to verdicts."""
+
+    def __init__(self, maxsize: int) -> None:
+        self.maxsize = maxsize
+        self._data: "OrderedDict[bytes, object]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: bytes):
+        with self._lock:
+            value = self._data.get(key)
+            if value is not None:
+                self._data.move_to_end(key)
+            return value
+
+    def put(self, key: bytes, value) -> None:
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            if len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+
+def _digest(text: str) -> bytes:
+    return hashlib.blake2b(text.encode("utf-8", "surrogatepass"), digest_size=16).digest()
+
+
+# Repeated payloads (bot spam, copy-paste abuse) reuse earlier verdicts.
+# Spam checks are case-sensitive so they key on the exact text; toxicity
+# keys on the stripped, lowercased text (toxic-bert is uncased).
+_spam_cache = _VerdictCache(maxsize=4096)
+_toxicity_cache = _VerdictCache(maxsize=4096)
+
+
+def clear_caches() -> None:
+    """Forget all cached spam and toxicity verdicts."""
+    _spam_cache.clear()
+    _toxicity_cache.clear()
 
 
 def is_spam(text: str) -> bool:
@@ -67,31 +203,43 @@ def is_spam(text: str) -> bool:
     - repeated lines/messages
     - excessive length
     - repeated characters
+
+    Verdicts are cached by message digest.
     """
     if not text:
         return False
 
+    key = _digest(text)
+    verdict = _spam_cache.get(key)
+    if verdict is None:
+        verdict = _spam_verdict(text)
+        _spam_cache.put(key, verdict)
+    return verdict
+
+
+def _spam_verdict(text: str) -> bool:
+    scan = _scan_text(text)
+
     # obvious spammy phrases
-    if any(p.search(text) for p in _SPAM_PATTERNS):
+    if scan.spam_phrases:
         logger.debug("spam detected by pattern")
         return True
 
     # too many URLs
-    urls = re.findall(r"https?://", text, re.I)
-    if len(urls) > 2:
-        logger.debug("spam detected by too many urls: %d", len(urls))
+    if scan.urls > 2:
+        logger.debug("spam detected by too many urls: %d", scan.urls)
         return True
 
     # repeated characters (aaaaaaa)
-    if re.search(r"(.)\1{6,}", text):
+    if scan.longest_repeat >= 7:
         logger.debug("spam detected by repeated characters")
         return True
 
     # repeated lines or repeated short messages
-    lines = [l.strip() for l in re.split(r"\n|\r", text) if l.strip()]
-    if lines:
-        most_common = max(lines, key=lines.count)
-        if lines.count(most_common) >= 3:
+    lines = [l.strip() for l in _LINE_SPLIT_RX.split(text) if l.strip()]
+    if len(lines) >= 3:
+        most_common, count = Counter(lines).most_common(1)[0]
+        if count >= 3:
             logger.debug("spam detected by repeated lines: %s", most_common[:40])
             return True
 
@@ -103,54 +251,122 @@ def is_spam(text: str) -> bool:
     return False
 
 
-def check_toxicity(message: str) -> Tuple[str, float]:
-    """Use a HF text-classification pipeline to return (label, score).
+def _fast_clean(text: str) -> bool:
+    """Cheap lexical screen: short, link-free text with no flagged words.
 
-    Falls back to a lightweight heuristic when the model isn't available.
+    Such messages skip the toxicity model entirely.
     """
-    if not message:
-        return ("clean", 0.0)
+    return (
+        len(text) < 40
+        and not _URL_RX.search(text)
+        and not _has_toxic_word(text)
+        and _find_unsafe_phrase(text.lower()) is None
+    )
 
-    try:
-        detector = _get_toxicity_detector()
-        out = detector(message, truncation=True)
-        if isinstance(out, list) and out:
-            label = out[0].get("label", "unknown")
-            score = float(out[0].get("score", 0.0))
-        elif isinstance(out, dict):
-            label = out.get("label", "unknown")
-            score = float(out.get("score", 0.0))
+
+def _heuristic_toxicity(message: str) -> Tuple[str, float]:
+    toxic = _has_toxic_word(message)
+    return ("heuristic_toxic" if toxic else "clean", 1.0 if toxic else 0.0)
+
+
+def check_toxicity_batch(messages: List[str]) -> List[Tuple[str, float]]:
+    """Score several messages with one padded forward pass.
+
+    Returns one (label, score) per message, in input order. Messages that
+    pass `_fast_clean` are reported clean without touching the model, and
+    model verdicts are cached by message digest. The lightweight heuristic
+    is used (uncached) when the model isn't available.
+    """
+    results: List[Tuple[str, float]] = [("clean", 0.0)] * len(messages)
+    pending: List[int] = []
+    keys: List[bytes] = []
+    for i, m in enumerate(messages):
+        if not m or _fast_clean(m):
+            continue
+        key = _digest(m.strip().lower())
+        cached = _toxicity_cache.get(key)
+        if cached is not None:
+            results[i] = cached
         else:
-            label, score = ("unknown", 0.0)
+            pending.append(i)
+            keys.append(key)
+    if not pending:
+        return results
 
-        logger.debug("toxicity model -> %s (%.3f)", label, score)
-        return (label, score)
+    try:
+        tokenizer, model = _get_toxicity_detector()
+        import torch
+
+        inputs = tokenizer(
+            [messages[i] for i in pending],
+            padding=True,
+            truncation=True,
+            max_length=256,
+            return_tensors="pt",
+        )
+        with torch.inference_mode():
+            logits = model(**inputs).logits
+
+        # multi-label heads (toxic-bert) score each label independently
+        if model.config.problem_type == "multi_label_classification":
+            scores = logits.sigmoid()
+        else:
+            scores = logits.softmax(-1)
+        top_scores, top_idx = scores.max(-1)
+
+        for i, key, score, idx in zip(pending, keys, top_scores.tolist(), top_idx.tolist()):
+            label = model.config.id2label.get(idx, "unknown")
+            results[i] = (label, float(score))
+            _toxicity_cache.put(key, results[i])
+            logger.debug("toxicity model -> %s (%.3f)", label, score)
     except Exception:
-        # fallback heuristic
-        tokens = re.findall(r"\w+", message.lower())
-        toxic = any(w in _TOXIC_WORDS for w in tokens)
-        return ("heuristic_toxic" if toxic else "clean", 1.0 if toxic else 0.0)
+        for i in pending:
+            results[i] = _heuristic_toxicity(messages[i])
+    return results
+
+
+def check_toxicity(message: str) -> Tuple[str, float]:
+    """Run the toxicity model directly and return its top (label, score).
+
+    Falls back to a lightweight heuristic when the model isn't available.
+    """
+    return check_toxicity_batch([message])[0]
 
 
-def is_toxic(text: str) -> bool:
+def is_toxicity_final(message: str) -> bool:
+    """True if ``check_toxicity(message)`` no longer depends on model availability.
+
+    That holds when the lexical screen answers it or the model's verdict is
+    cached; heuristic fallback results may change once the model loads.
+    """
+    if not message or _fast_clean(message):
+        return True
+    return _toxicity_cache.get(_digest(message.strip().lower())) is not None
+
+
+def is_toxic(text: str, toxicity: Optional[Tuple[str, float]] = None) -> bool:
     """Public convenience function: try model first, then fallback to blacklist.
 
+    Pass a precomputed ``toxicity`` (label, score) to skip the model call.
     Returns True when message is considered toxic.
     """
     try:
-        label, score = check_toxicity(text)
+        label, score = toxicity or check_toxicity(text)
         l = label.lower()
         # treat a few label substrings as toxic indicators
         toxic_indicators = ("tox", "abuse", "offens", "insult", "threat", "hate")
         if any(sub in l for sub in toxic_indicators) and score >= 0.6:
             logger.debug("is_toxic -> model says toxic: %s %.2f", label, score)
             return True
+        # "clean" only comes from paths that already ran the word scan
+        # (empty text, the fast lexical screen, the heuristic fallback)
+        if label == "clean":
+            return False
     except Exception:
         logger.debug("toxicity model failed, falling back to heuristic")
 
     # fallback blacklist
-    tokens = re.findall(r"\w+", (text or "").lower())
-    return any(w in _TOXIC_WORDS for w in tokens)
+    return _has_toxic_word(text or "")
 
 
 # Backwards-compatible alias expected by some callers
@@ -159,6 +375,9 @@ def detect_spam(text: str) -> bool:
     return is_spam(text)
 
 
+_REPEAT_THRESHOLD = 3
+
+
 def is_suspicious(text: str, recent_messages: list[str] | None = None) -> bool:
     """Detect suspicious activity using lightweight heuristics.
 
@@ -170,52 +389,49 @@ def is_suspicious(text: str, recent_messages: list[str] | None = None) -> bool:
         return False
 
     # repeated content in recent messages
-    if recent_messages:
-        matches = sum(1 for m in recent_messages if m.strip() == text.strip())
-        if matches >= 3:
+    # fewer recent messages than the threshold can never trip it
+    if recent_messages and len(recent_messages) >= _REPEAT_THRESHOLD:
+        stripped = text.strip()
+        matches = sum(1 for m in recent_messages if m.strip() == stripped)
+        if matches >= _REPEAT_THRESHOLD:
             logger.debug("suspicious: repeated message seen %d times", matches)
             return True
 
+    scan = _scan_text(text)
+
     # mention / URL density
-    mentions = len(re.findall(r"@\w+", text))
-    urls = len(re.findall(r"https?://", text))
-    if mentions >= 5 or urls >= 5:
-        logger.debug("suspicious: mention/url density mentions=%d urls=%d", mentions, urls)
+    if scan.mentions >= 5 or scan.urls >= 5:
+        logger.debug("suspicious: mention/url density mentions=%d urls=%d", scan.mentions, scan.urls)
         return True
 
     # short but repeating content (e.g., short spammy bursts)
-    if len(text) < 40 and re.search(r"(.)\1{4,}", text):
+    if len(text) < 40 and scan.longest_repeat >= 5:
         logger.debug("suspicious: short repeating characters")
         return True
 
     return False
 
 
-def is_unsafe(text: str) -> bool:
+def is_unsafe(text: str, toxicity: Optional[Tuple[str, float]] = None) -> bool:
     """Block obviously unsafe content (self-harm, threats, explicit sexual content).
 
     This is intentionally conservative — use a proper safety model in production.
+    Pass a precomputed ``toxicity`` (label, score) to skip the model call.
     """
-    if not text:
+    if not text or _fast_clean(text):
         return False
 
     low = text.lower()
 
     # quick heuristic checks
-    unsafe_indicators = [
-        r"\b(i will kill|i'm going to kill|i'm going to hurt)\b",
-        r"\b(suicide|kill myself|end my life)\b",
-        r"\b(contact me at|my ssn|credit card)\b",
-        r"\b(nude|sex with)\b",
-    ]
-    for pat in unsafe_indicators:
-        if re.search(pat, low):
-            logger.debug("unsafe content matched pattern: %s", pat)
-            return True
+    phrase = _find_unsafe_phrase(low)
+    if phrase:
+        logger.debug("unsafe content matched phrase: %s", phrase)
+        return True
 
     # rely on toxicity model as a final check for threats/hate
     try:
-        label, score = check_toxicity(text)
+        label, score = toxicity or check_toxicity(text)
         if isinstance(label, str) and ("threat" in label.lower() or "hate" in label.lower()) and score >= 0.6:
             logger.debug("unsafe content flagged by toxicity model: %s %.2f", label, score)
             return True
@@ -0,0 +1,115 @@
+"""HangHive AI — Request-coalescing micro-batcher.
+
+Collects concurrent single-item submissions into one batched call so the
+transformer forward pass is paid once per batch instead of once per request.
+
+Usage:
+    from app.batcher import MicroBatcher
+    from app.automod import check_toxicity_batch
+
+    toxicity = MicroBatcher(check_toxicity_batch, name="toxicity")
+    toxicity.start()  # e.g. in a FastAPI startup hook
+    label, score = await toxicity.submit("some message")
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+from typing import Any, Callable, Sequence
+
+logger = logging.getLogger(__name__)
+
+MAX_BATCH = 16
+MAX_DELAY_MS = 10
+
+
+class MicroBatcher:
+    """Feed queued items to ``batch_fn`` in groups of up to ``max_batch``.
+
+    ``batch_fn`` takes a list of items and returns one result per item, in
+    order.  It runs in a worker thread so the event loop stays responsive.
+    The first item of a batch waits at most ``max_delay_ms`` for company.
+    """
+
+    def __init__(
+        self,
+        batch_fn: Callable[[list[Any]], Sequence[Any]],
+        max_batch: int = MAX_BATCH,
+        max_delay_ms: float = MAX_DELAY_MS,
+        name: str = "batcher",
+    ) -> None:
+        self._batch_fn = batch_fn
+        self.max_batch = max_batch
+        self.max_delay = max_delay_ms / 1000.0
+        self.name = name
+        self._queue: asyncio.Queue | None = None
+        self._task: asyncio.Task | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+
+    def start(self) -> None:
+        """Start the consumer task on the running loop (no-op if running)."""
+        loop = asyncio.get_running_loop()
+        if self._task is not None and not self._task.done() and self._loop is loop:
+            return
+        self._loop = loop
+        self._queue = asyncio.Queue()
+        self._task = loop.create_task(self._consume(), name=f"{self.name}-batcher")
+
+    async def stop(self) -> None:
+        """Cancel the consumer and fail any submissions still queued."""
+        task, self._task = self._task, None
+        if task is None:
+            return
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+
+        while self._queue is not None and not self._queue.empty():
+            _, fut = self._queue.get_nowait()
+            if not fut.done():
+                fut.set_exception(RuntimeError(f"{self.name} batcher stopped"))
+
+    async def submit(self, item: Any) -> Any:
+        """Queue *item* and wait for its result from the next batch."""
+        self.start()
+        fut = self._loop.create_future()
+        self._queue.put_nowait((item, fut))
+        return await fut
+
+    async def _consume(self) -> None:
+        while True:
+            batch = [await self._queue.get()]
+            try:
+                # give concurrent requests a moment to join this batch
+                if self._queue.qsize() < self.max_batch - 1:
+                    await asyncio.sleep(self.max_delay)
+                while len(batch) < self.max_batch and not self._queue.empty():
+                    batch.append(self._queue.get_nowait())
+                await self._run_batch(batch)
+            except asyncio.CancelledError:
+                for _, fut in batch:
+                    if not fut.done():
+                        fut.set_exception(RuntimeError(f"{self.name} batcher stopped"))
+                raise
+
+    async def _run_batch(self, batch: list[tuple[Any, asyncio.Future]]) -> None:
+        # skip callers that were cancelled while waiting
+        live = [(item, fut) for item, fut in batch if not fut.done()]
+        if not live:
+            return
+
+        try:
+            results = await asyncio.to_thread(self._batch_fn, [item for item, _ in live])
+        except Exception as exc:
+            logger.debug("%s batch of %d failed: %s", self.name, len(live), exc)
+            for _, fut in live:
+                if not fut.done():
+                    fut.set_exception(exc)
+            return
+
+        logger.debug("%s batch of %d done", self.name, len(live))
+        for (_, fut), result in zip(live, results):
+            if not fut.done():
+                fut.set_result(result)
@@ -11,6 +11,7 @@ Usage:
 """
 from __future__ import annotations
 
+import functools
 import logging
 import os
 import re
@@ -22,13 +23,8 @@ os.environ["TOKENIZERS_PARALLELISM"] = "false"
 os.environ["TRANSFORMERS_NO_ADVISORY_WARNINGS"] = "1"
 os.environ["HF_HUB_DISABLE_PROGRESS_BARS"] = "1"
 os.environ["HF_HUB_DISABLE_TELEMETRY"] = "1"
-
-# Apply transformers-level silencing (safe even if transformers not installed yet)
-try:
-    import transformers
-    transformers.logging.set_verbosity_error()
-except Exception:
-    pass
+# transformers reads this when it is first imported (lazily, on model load)
+os.environ.setdefault("TRANSFORMERS_VERBOSITY", "error")
 
 logging.getLogger("transformers").setLevel(logging.ERROR)
 logging.getLogger("transformers.modeling_utils").setLevel(logging.ERROR)
@@ -42,12 +38,26 @@ warnings.filterwarnings("ignore", message=".*max_new_tokens.*")
 
 logger = logging.getLogger(__name__)
 
+try:
+    from .utils import silence_transformers
+except ImportError:
+    from utils import silence_transformers  # type: ignore
+
 # ---------------------------------------------------------------------------
 # Constants
 # ---------------------------------------------------------------------------
 _MODEL_NAME = "gpt2"
 _MAX_NEW_TOKENS = 64  # short replies → faster generation
 
+_MENTION_RX = re.compile(r"(?i)@AI\b")
+_SENT_SPLIT_RX = re.compile(r"(?<=[.!?])\s+")
+_ASSISTANT_PREFIX_RX = re.compile(r"^\s*Assistant:\s*", re.IGNORECASE)
+_WS_COLLAPSE_RX = re.compile(r"\s{2,}")
+
+# Generation stops as soon as the model starts a new turn.
+_TURN_MARKERS = ("\nUser:", "\nAssistant:", "\nSystem:")
+_TURN_MARKER_RX = re.compile("|".join(map(re.escape, _TURN_MARKERS)))
+
 VALID_COMMUNITY_TYPES = frozenset(
     ["general", "developers", "support", "gaming", "moderation", "study"]
 )
@@ -67,62 +77,132 @@ _SYSTEM_PROMPTS: dict[str, str] = {
 # ---------------------------------------------------------------------------
 def _strip_mention(text: str) -> str:
     """Remove @AI mention from message text."""
-    return re.sub(r"(?i)@AI\b", "", text).strip()
+    return _MENTION_RX.sub("", text).strip()
+
+
+@functools.lru_cache(maxsize=16)
+def _community_key(community_type: str) -> str:
+    """Normalise *community_type* to a known key, defaulting to general."""
+    ct = (community_type or "general").lower().strip()
+    return ct if ct in _SYSTEM_PROMPTS else "general"
 
 
 def _system_prompt_for(community_type: str) -> str:
     """Return the system prompt for *community_type*, defaulting to general."""
-    ct = (community_type or "general").lower().strip()
-    return _SYSTEM_PROMPTS.get(ct, _SYSTEM_PROMPTS["general"])
+    return _SYSTEM_PROMPTS[_community_key(community_type)]
 
 
 def _trim_repetition(text: str) -> str:
     """Detect and remove sentence-level loops in generated text."""
-    sentences = re.split(r"(?<=[.!?])\s+", text)
+    sentences = _SENT_SPLIT_RX.split(text)
     if len(sentences) < 3:
         return text
 
-    seen: list[str] = []
+    seen: set[str] = set()
+    kept: list[str] = []
     for s in sentences:
         normed = s.strip().lower()
-        if normed in [x.strip().lower() for x in seen]:
+        if normed in seen:
             # loop detected — return everything up to this point
             break
-        seen.append(s)
-    return " ".join(seen).strip()
+        seen.add(normed)
+        kept.append(s)
+    return " ".join(kept).strip()
 
 
 # ---------------------------------------------------------------------------
-# Lazy pipeline loader
+# Lazy model loader
 # ---------------------------------------------------------------------------
 _text_generator = None
 
+# Token ids of the fixed few-shot prompt prefix, per community key.
+# Filled when the model loads so requests only tokenize their own tail.
+_PREFIX_IDS: dict[str, list[int]] = {}
+
 
 def _get_text_generator():
-    """Lazy-load the HF text-generation pipeline (singleton)."""
+    """Lazy-load the GPT-2 tokenizer + causal LM (singleton)."""
     global _text_generator
     if _text_generator is not None:
         return _text_generator
 
     try:
-        from transformers import pipeline
+        silence_transformers()
+        from transformers import AutoModelForCausalLM, AutoTokenizer
 
-        _text_generator = pipeline(
-            "text-generation",
-            model=_MODEL_NAME,
-            device=-1,  # CPU; set to 0 for CUDA
-        )
-        # Clear the pipeline's default max_length (50) so it does NOT conflict
+        tokenizer = AutoTokenizer.from_pretrained(_MODEL_NAME)
+        model = AutoModelForCausalLM.from_pretrained(_MODEL_NAME)  # CPU
+        model.eval()
+        # Clear the default max_length (50) so it does NOT conflict
         # with max_new_tokens passed at call time.
-        _text_generator.model.config.max_length = None
+        model.config.max_length = None
+        # left-pad batches so every row continues from its own last token
+        tokenizer.padding_side = "left"
+        tokenizer.pad_token = tokenizer.eos_token
+        for ct in _SYSTEM_PROMPTS:
+            _PREFIX_IDS[ct] = tokenizer(_PROMPT_PREFIX[ct])["input_ids"]
+        _text_generator = (tokenizer, model)
         return _text_generator
     except Exception as exc:
         _text_generator = None
-        raise RuntimeError(f"text-generation pipeline unavailable: {exc}") from exc
+        raise RuntimeError(f"text-generation model unavailable: {exc}") from exc
+
+
+def _turn_stopper(tokenizer, prompt_len: int):
+    """Build stopping criteria that end each row once it emits a turn marker.
+
+    Only the last few generated tokens are decoded per step; the prompt
+    itself (which contains markers) is never inspected.
+    """
+    import torch
+    from transformers import StoppingCriteria, StoppingCriteriaList
+
+    class _StopOnTurnMarker(StoppingCriteria):
+        def __call__(self, input_ids, scores, **kwargs):
+            window = input_ids[:, max(prompt_len, input_ids.shape[1] - 4):]
+            texts = tokenizer.batch_decode(window)
+            done = [any(m in t for m in _TURN_MARKERS) for t in texts]
+            return torch.tensor(done, dtype=torch.bool, device=input_ids.device)
+
+    return StoppingCriteriaList([_StopOnTurnMarker()])
+
+
+def _generate_texts(prompts: list[tuple[str, str]]) -> list[str]:
+    """Run one batched ``model.generate`` over ``(community_key, tail)`` prompts.
+
+    Each row is the cached prefix ids for its community followed by the
+    freshly tokenized tail.  Returns only the newly generated text for each
+    prompt, in input order.
+    """
+    tokenizer, model = _get_text_generator()
+    import torch
+
+    tails = tokenizer([tail for _, tail in prompts])["input_ids"]
+    input_ids = [_PREFIX_IDS[ct] + ids for (ct, _), ids in zip(prompts, tails)]
+    inputs = tokenizer.pad({"input_ids": input_ids}, padding=True, return_tensors="pt")
+    with torch.inference_mode():
+        # Pass all generation hyper-parameters as direct kwargs.
+        # This avoids the "Passing generation_config together with
+        # generation-related arguments is deprecated" warning.
+        # Greedy decoding with the KV cache; repetition_penalty keeps
+        # greedy output from looping.
+        output_ids = model.generate(
+            **inputs,
+            max_new_tokens=_MAX_NEW_TOKENS,
+            do_sample=False,
+            num_beams=1,
+            use_cache=True,
+            repetition_penalty=1.2,
+            pad_token_id=tokenizer.eos_token_id,
+            eos_token_id=tokenizer.eos_token_id,
+            stopping_criteria=_turn_stopper(tokenizer, inputs["input_ids"].shape[1]),
+        )
+    new_ids = output_ids[:, inputs["input_ids"].shape[1]:]
+    return tokenizer.batch_decode(new_ids, skip_special_tokens=True)
 
 
 def warm_up_model() -> bool:
-    """Initialise the text-generation pipeline.
+    """Initialise the text-generation model.
 
     Call once at startup so the first real request is fast.
     Returns True on success, False on failure.
@@ -134,32 +214,36 @@ def warm_up_model() -> bool:
         return False
 
 
-# ---------------------------------------------------------------------------
-# Public API
-# ---------------------------------------------------------------------------
-def generate_reply(
-    message: str,
-    community_type: str = "general",
-    context: list | None = None,
-) -> str:
-    """Generate a concise reply to *message*.
+def _prompt_prefix(community_type: str) -> str:
+    """Return the fixed system + few-shot part of the prompt."""
+    return "\n".join([
+        f"System: {_system_prompt_for(community_type)}",
+        "Instruction: Answer the user directly. Do not repeat the question or list numbered questions.",
+        "",
+        "User: hello",
+        "Assistant: Hi there! How can I help you today?",
+        "User: how are you",
+        "Assistant: I'm doing great, thank you! What can I help you with?",
+        "",
+    ])
 
-    Args:
-        message: Raw user message (may contain ``@AI``).
-        community_type: Community flavour — must be one of
-            :data:`VALID_COMMUNITY_TYPES` (invalid values default to
-            ``"general"``).
-        context: Optional conversation history.  Each item is either a plain
-            string (treated as a user message) or a dict with keys
-            ``role`` (``"user"`` / ``"assistant"``) and ``content``.
 
-    Returns:
-        The assistant's reply text.  On internal errors a friendly
-        fallback string is returned so the caller never sees an exception.
+# Pre-joined prompt prefix per community key (built once at import).
+_PROMPT_PREFIX: dict[str, str] = {ct: _prompt_prefix(ct) for ct in _SYSTEM_PROMPTS}
+
+
+def _build_prompt_tail(user_text: str, context: list | str | None) -> str:
+    """Assemble the per-request part of the prompt: history plus this turn.
+
+    ``_PROMPT_PREFIX[ct] + _build_prompt_tail(...)`` is the full prompt; the
+    tail starts with its own newline so the split falls on a token boundary.
+    A string *context* is history already rendered as ``User:`` /
+    ``Assistant:`` lines and is used as-is.
     """
-    user_text = _strip_mention(message)
-    if not user_text:
-        return "Hi — how can I help?"
+    if isinstance(context, str):
+        history = context.strip("\n")
+        history = "\n" + history if history else ""
+        return f"{history}\nUser: {user_text}\nAssistant:"
 
     # --- build context lines ------------------------------------------------
     history_lines: list[str] = []
@@ -180,75 +264,91 @@ def generate_reply(
             except Exception:
                 continue
 
-    # --- assemble prompt with few-shot examples -----------------------------
-    prompt_parts: list[str] = [
-        f"System: {_system_prompt_for(community_type)}",
-        "Instruction: Answer the user directly. Do not repeat the question or list numbered questions.",
-        "",
-        "User: hello",
-        "Assistant: Hi there! How can I help you today?",
-        "User: how are you",
-        "Assistant: I'm doing great, thank you! What can I help you with?",
-        "",
-    ]
-    if history_lines:
-        prompt_parts.extend(history_lines)
-
-    prompt_parts.append(f"User: {user_text}")
-    prompt_parts.append("Assistant:")
-    prompt = "\n".join(prompt_parts)
+    history = "\n" + "\n".join(history_lines) if history_lines else ""
+    return f"{history}\nUser: {user_text}\nAssistant:"
 
-    # --- generate -----------------------------------------------------------
-    try:
-        gen = _get_text_generator()
 
-        # Pass all generation hyper-parameters as direct kwargs.
-        # This avoids the "Passing generation_config together with
-        # generation-related arguments is deprecated" warning.
-        outputs = gen(
-            prompt,
-            max_new_tokens=_MAX_NEW_TOKENS,
-            do_sample=True,
-            temperature=0.7,
-            top_p=0.9,
-            repetition_penalty=1.2,
-            pad_token_id=50256,
-        )
+def _clean_reply(raw: str) -> str:
+    """Turn raw generated text into a single tidy assistant turn."""
+    reply = raw.strip()
 
-        if not outputs or not isinstance(outputs, list):
-            return "I'm sorry — I couldn't create a response right now."
+    # strip a leading "Assistant:" the model may echo
+    reply = _ASSISTANT_PREFIX_RX.sub("", reply).strip()
 
-        raw: str = outputs[0].get("generated_text") or ""
+    # drop the new-turn marker that stopped generation
+    reply = _TURN_MARKER_RX.split(reply, 1)[0].strip()
 
-        # --- extract only the new assistant text ----------------------------
-        if raw.startswith(prompt):
-            reply = raw[len(prompt):].strip()
-        else:
-            # fallback: strip known prefixes
-            reply = raw.split("Assistant:")[-1].strip()
+    # collapse whitespace
+    reply = _WS_COLLAPSE_RX.sub(" ", reply)
 
-        # strip a leading "Assistant:" the model may echo
-        reply = re.sub(r"^\s*Assistant:\s*", "", reply, flags=re.IGNORECASE).strip()
+    # trim sentence-level repetition
+    reply = _trim_repetition(reply)
 
-        # cut off at the first new-turn marker
-        for marker in ("\nUser:", "\nAssistant:", "\nSystem:"):
-            idx = reply.find(marker)
-            if idx != -1:
-                reply = reply[:idx].strip()
+    # hard limit
+    if len(reply) > 500:
+        reply = reply[:500].rsplit(".", 1)[0] + "..."
 
-        # collapse whitespace
-        reply = re.sub(r"\s{2,}", " ", reply)
+    return reply or "I'm sorry — I couldn't create a response right now."
 
-        # trim sentence-level repetition
-        reply = _trim_repetition(reply)
 
-        # hard limit
-        if len(reply) > 500:
-            reply = reply[:500].rsplit(".", 1)[0] + "..."
+# ---------------------------------------------------------------------------
+# Public API
+# ---------------------------------------------------------------------------
+def generate_replies(requests: list[tuple[str, str, list | str | None]]) -> list[str]:
+    """Generate replies for several ``(message, community_type, context)`` requests.
 
-        return reply or "I'm sorry — I couldn't create a response right now."
+    All prompts share one batched forward pass; see :func:`generate_reply`
+    for the meaning of each field.  Returns one reply per request, in order.
+    """
+    replies: list[str] = ["Hi — how can I help?"] * len(requests)
+    prompts: list[tuple[str, str]] = []
+    pending: list[int] = []
+    for i, (message, community_type, context) in enumerate(requests):
+        user_text = _strip_mention(message)
+        if user_text:
+            pending.append(i)
+            prompts.append((_community_key(community_type), _build_prompt_tail(user_text, context)))
+    if not pending:
+        return replies
 
+    # --- generate -----------------------------------------------------------
+    try:
+        raw_replies = _generate_texts(prompts)
+        for i, raw in zip(pending, raw_replies):
+            replies[i] = _clean_reply(raw)
     except RuntimeError:
-        return "Sorry — the text-generation model is not available right now."
+        for i in pending:
+            replies[i] = "Sorry — the text-generation model is not available right now."
     except Exception:
-        return "Sorry — I couldn't generate a reply at the moment."
\ No newline at end of file
+        for i in pending:
+            replies[i] = "Sorry — I couldn't generate a reply at the moment."
+    return replies
+
+
+def generate_reply(
+    message: str,
+    community_type: str = "general",
+    context: list | None = None,
+    context_text: str | None = None,
+) -> str:
+    """Generate a concise reply to *message*.
+
+    Args:
+        message: Raw user message (may contain ``@AI``).
+        community_type: Community flavour — must be one of
+            :data:`VALID_COMMUNITY_TYPES` (invalid values default to
+            ``"general"``).
+        context: Optional conversation history.  Each item is either a plain
+            string (treated as a user message) or a dict with keys
+            ``role`` (``"user"`` / ``"assistant"``) and ``content``.
+        context_text: The same history already rendered as ``User: ...`` /
+            ``Assistant: ...`` lines.  Takes precedence over *context*, so
+            callers that keep a running transcript skip re-rendering it.
+
+    Returns:
+        The assistant's reply text.  On internal errors a friendly
+        fallback string is returned so the caller never sees an exception.
+    """
+    if context_text is not None:
+        context = context_text
+    return generate_replies([(message, community_type, context)])[0]
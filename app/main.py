@@ -1,13 +1,15 @@
 from typing import List, Optional
+import asyncio
 import re
 
 from fastapi import FastAPI, HTTPException
 from pydantic import BaseModel
 
-from .chatbot import generate_reply
-from .automod import is_spam, is_toxic, is_suspicious, is_unsafe
-from .summarizer import summarize_text
-from .moderation import init_db, log_event, get_events
+from .batcher import MicroBatcher
+from .chatbot import generate_replies, warm_up_model
+from .automod import check_toxicity_batch, is_spam, is_toxic, is_suspicious, is_unsafe, warm_up_automod
+from .summarizer import summarize_text, warm_up_summarizer
+from .moderation import init_db, log_event, get_event, get_events
 
 
 app = FastAPI(title="HangHive AI — Community Assistant")
@@ -15,6 +17,33 @@ app = FastAPI(title="HangHive AI — Community Assistant")
 # initialize moderation DB
 init_db()
 
+# coalesce concurrent model calls into batched forward passes
+toxicity_batcher = MicroBatcher(check_toxicity_batch, name="toxicity")
+reply_batcher = MicroBatcher(generate_replies, name="chat")
+
+
+@app.on_event("startup")
+async def start_batchers():
+    toxicity_batcher.start()
+    reply_batcher.start()
+
+
+@app.on_event("startup")
+async def warm_up_models():
+    """Load all three models concurrently so cold starts overlap."""
+    loop = asyncio.get_running_loop()
+    await asyncio.gather(
+        loop.run_in_executor(None, warm_up_automod),
+        loop.run_in_executor(None, warm_up_model),
+        loop.run_in_executor(None, warm_up_summarizer),
+    )
+
+
+@app.on_event("shutdown")
+async def stop_batchers():
+    await toxicity_batcher.stop()
+    await reply_batcher.stop()
+
 
 class ChatRequest(BaseModel):
     user_id: Optional[str] = None
@@ -43,9 +72,12 @@ class SummarizeResponse(BaseModel):
     summary: str
 
 
+_AI_MENTION_RX = re.compile(r'(^|\s)@AI\b', flags=re.IGNORECASE)
+
+
 def contains_ai_mention(text: str) -> bool:
     """Return True if the text contains an @AI mention (word-boundary, case-insensitive)."""
-    return bool(re.search(r'(^|\s)@AI\b', text, flags=re.IGNORECASE))
+    return bool(_AI_MENTION_RX.search(text))
 
 
 @app.post("/chat", response_model=ChatResponse)
@@ -59,32 +91,33 @@ async def chat_endpoint(req: ChatRequest):
     if req.require_mention and not contains_ai_mention(req.message):
         return ChatResponse(handled=False)
 
-    # Run automod checks before invoking the chatbot
+    # Run automod checks before invoking the chatbot. The lexical checks run
+    # on worker threads while the toxicity model scores the message (one
+    # batched pass shared by the unsafe + toxic checks); the reported reason
+    # keeps the original spam > suspicious > unsafe > toxic priority.
     try:
-        if is_spam(req.message):
-            log_event("blocked", req.user_id, req.message, reason="spam", metadata={"community_type": req.community_type})
-            return ChatResponse(handled=True, blocked=True, reason="spam")
-
-        if is_suspicious(req.message, recent_messages=(req.context or [])):
-            log_event("blocked", req.user_id, req.message, reason="suspicious", metadata={"community_type": req.community_type})
-            return ChatResponse(handled=True, blocked=True, reason="suspicious")
-
-        if is_unsafe(req.message):
-            log_event("blocked", req.user_id, req.message, reason="unsafe", metadata={"community_type": req.community_type})
-            return ChatResponse(handled=True, blocked=True, reason="unsafe")
-
-        if is_toxic(req.message):
-            log_event("blocked", req.user_id, req.message, reason="toxic", metadata={"community_type": req.community_type})
-            return ChatResponse(handled=True, blocked=True, reason="toxic")
+        spam, suspicious, toxicity = await asyncio.gather(
+            asyncio.to_thread(is_spam, req.message),
+            asyncio.to_thread(is_suspicious, req.message, req.context or []),
+            toxicity_batcher.submit(req.message),
+        )
+        checks = (
+            ("spam", spam),
+            ("suspicious", suspicious),
+            ("unsafe", is_unsafe(req.message, toxicity=toxicity)),
+            ("toxic", is_toxic(req.message, toxicity=toxicity)),
+        )
+        for reason, hit in checks:
+            if hit:
+                log_event("blocked", req.user_id, req.message, reason=reason, metadata={"community_type": req.community_type})
+                return ChatResponse(handled=True, blocked=True, reason=reason)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"automod error: {e}")
 
     # Generate AI reply using chatbot module (passes community_type + context)
     try:
-        reply = generate_reply(
-            req.message,
-            community_type=(req.community_type or "general"),
-            context=(req.context or []),
+        reply = await reply_batcher.submit(
+            (req.message, (req.community_type or "general"), (req.context or []))
         )
         # log successful reply for moderation/analytics
         log_event("reply", req.user_id, req.message, reason=None, metadata={"community_type": req.community_type, "reply_preview": (reply or '')[:200]})
@@ -98,7 +131,8 @@ async def chat_endpoint(req: ChatRequest):
 async def summarize_endpoint(req: SummarizeRequest):
     """Return a short summary for the provided conversation text."""
     try:
-        summary = summarize_text(req.conversation, max_words=(req.max_length or 60))
+        # CPU-bound model call: keep it off the event loop
+        summary = await asyncio.to_thread(summarize_text, req.conversation, max_words=(req.max_length or 60))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"summarizer error: {e}")
 
@@ -115,11 +149,10 @@ def admin_get_moderation(limit: int = 100):
 
 @app.get("/admin/moderation/{event_id}")
 def admin_get_moderation_event(event_id: int):
-    events = get_events(limit=1000)
-    for e in events:
-        if e["id"] == event_id:
-            return e
-    raise HTTPException(status_code=404, detail="event not found")
+    event = get_event(event_id)
+    if event is None:
+        raise HTTPException(status_code=404, detail="event not found")
+    return event
 
 
 @app.get("/")
@@ -1,72 +1,158 @@
+import atexit
 import json
 import os
+import queue
 import sqlite3
+import threading
+import time
+from concurrent.futures import Future
 from typing import Any, Dict, List, Optional
 
 DB_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "moderation.db"))
 
+# Background writer: log_event only enqueues; one daemon thread inserts the
+# queued rows in a single transaction every _FLUSH_INTERVAL or _FLUSH_ROWS.
+_FLUSH_INTERVAL = 0.05
+_FLUSH_ROWS = 100
+
+_conn: Optional[sqlite3.Connection] = None
+_conn_lock = threading.Lock()
+_pending: "queue.Queue[tuple]" = queue.Queue()
+_writer: Optional[threading.Thread] = None
+
 
 def _connect():
-    os.makedirs(os.path.dirname(DB_PATH), exist_ok=True)
-    conn = sqlite3.connect(DB_PATH, timeout=5)
+    conn = sqlite3.connect(DB_PATH, timeout=5, check_same_thread=False)
     conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
     return conn
 
 
 def init_db() -> None:
-    conn = _connect()
-    with conn:
-        conn.execute(
+    global _conn, _writer
+    with _conn_lock:
+        if _conn is None:
+            os.makedirs(os.path.dirname(DB_PATH), exist_ok=True)
+            _conn = _connect()
+        with _conn:
+            _conn.execute(
+                """
+            CREATE TABLE IF NOT EXISTS events (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                ts DATETIME DEFAULT CURRENT_TIMESTAMP,
+                event_type TEXT,
+                user_id TEXT,
+                message TEXT,
+                reason TEXT,
+                metadata TEXT
+            )
             """
-        CREATE TABLE IF NOT EXISTS events (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            ts DATETIME DEFAULT CURRENT_TIMESTAMP,
-            event_type TEXT,
-            user_id TEXT,
-            message TEXT,
-            reason TEXT,
-            metadata TEXT
-        )
-        """
-        )
-    conn.close()
-
-
-def log_event(event_type: str, user_id: Optional[str], message: str, reason: Optional[str] = None, metadata: Optional[Dict[str, Any]] = None) -> int:
-    conn = _connect()
-    meta_json = json.dumps(metadata or {})
-    with conn:
-        cur = conn.execute(
-            "INSERT INTO events (event_type, user_id, message, reason, metadata) VALUES (?, ?, ?, ?, ?)",
-            (event_type, user_id, message, reason, meta_json),
-        )
-        event_id = cur.lastrowid
-    conn.close()
-    return event_id
+            )
+            _conn.execute("CREATE INDEX IF NOT EXISTS idx_events_ts ON events(ts DESC)")
+            _conn.execute("CREATE INDEX IF NOT EXISTS idx_events_user ON events(user_id)")
+        if _writer is None:
+            _writer = threading.Thread(target=_writer_loop, name="moderation-writer", daemon=True)
+            _writer.start()
 
 
-def get_events(limit: int = 100) -> List[Dict[str, Any]]:
-    conn = _connect()
-    with conn:
-        cur = conn.execute("SELECT * FROM events ORDER BY ts DESC LIMIT ?", (limit,))
-        rows = cur.fetchall()
-    conn.close()
-    results: List[Dict[str, Any]] = []
-    for r in rows:
-        meta = {}
+def _write_batch(batch: List[tuple]) -> None:
+    # drop events whose futures were cancelled; the rest can't be any more
+    batch = [(row, fut) for row, fut in batch if fut.set_running_or_notify_cancel()]
+    if not batch:
+        return
+    try:
+        with _conn_lock, _conn:
+            ids = [
+                _conn.execute(
+                    "INSERT INTO events (event_type, user_id, message, reason, metadata) VALUES (?, ?, ?, ?, ?)",
+                    row,
+                ).lastrowid
+                for row, _ in batch
+            ]
+    except Exception as exc:
+        for _, fut in batch:
+            fut.set_exception(exc)
+        return
+    for (_, fut), event_id in zip(batch, ids):
+        fut.set_result(event_id)
+
+
+def _writer_loop() -> None:
+    while True:
+        batch = [_pending.get()]
+        deadline = time.monotonic() + _FLUSH_INTERVAL
+        while len(batch) < _FLUSH_ROWS:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(_pending.get(timeout=timeout))
+            except queue.Empty:
+                break
         try:
-            meta = json.loads(r["metadata"] or "{}")
+            _write_batch(batch)
         except Exception:
-            meta = {}
-        results.append(
-            {
-                "id": r["id"],
-                "ts": r["ts"],
-                "event_type": r["event_type"],
-                "user_id": r["user_id"],
-                "message": r["message"],
-                "reason": r["reason"],
-                "metadata": meta,
-            }
-        )
-    return results
+            pass  # one bad batch must not stop the writer
+        finally:
+            for _ in batch:
+                _pending.task_done()
+
+
+def flush() -> None:
+    """Block until every queued event has been written."""
+    if _writer is not None:
+        _pending.join()
+
+
+atexit.register(flush)
+
+
+def log_event(event_type: str, user_id: Optional[str], message: str, reason: Optional[str] = None, metadata: Optional[Dict[str, Any]] = None) -> "Future[int]":
+    """Queue an event for the background writer; the future resolves to its id."""
+    if _writer is None:
+        init_db()
+    # serialize here so bad metadata raises to the caller, not the writer
+    row = (event_type, user_id, message, reason, json.dumps(metadata or {}))
+    fut: "Future[int]" = Future()
+    _pending.put((row, fut))
+    return fut
+
+
+_EVENT_COLUMNS = "id, ts, event_type, user_id, message, reason, metadata"
+
+
+def _row_to_event(r: sqlite3.Row) -> Dict[str, Any]:
+    meta = {}
+    try:
+        meta = json.loads(r["metadata"] or "{}")
+    except Exception:
+        meta = {}
+    return {
+        "id": r["id"],
+        "ts": r["ts"],
+        "event_type": r["event_type"],
+        "user_id": r["user_id"],
+        "message": r["message"],
+        "reason": r["reason"],
+        "metadata": meta,
+    }
+
+
+def _query(sql: str, params: tuple) -> List[sqlite3.Row]:
+    if _writer is None:
+        init_db()
+    # read-your-writes: include events still waiting in the queue
+    flush()
+    with _conn_lock:
+        return _conn.execute(sql, params).fetchall()
+
+
+def get_events(limit: int = 100) -> List[Dict[str, Any]]:
+    rows = _query(f"SELECT {_EVENT_COLUMNS} FROM events ORDER BY ts DESC LIMIT ?", (limit,))
+    return [_row_to_event(r) for r in rows]
+
+
+def get_event(event_id: int) -> Optional[Dict[str, Any]]:
+    rows = _query(f"SELECT {_EVENT_COLUMNS} FROM events WHERE id = ?", (event_id,))
+    return _row_to_event(rows[0]) if rows else None
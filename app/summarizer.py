@@ -1,12 +1,28 @@
 import logging
+import os
 import re
 from typing import List
 
+try:
+    from .utils import load_onnx_model, optimize_for_cpu, silence_transformers
+except ImportError:
+    from utils import load_onnx_model, optimize_for_cpu, silence_transformers  # type: ignore
+
 logger = logging.getLogger(__name__)
 
-_SUMMARIZER_MODEL = "sshleifer/distilbart-cnn-12-6"
+# 6-layer decoder distilbart; HANGHIVE_SUMMARIZER_MODEL selects another
+# checkpoint (e.g. "sshleifer/distilbart-xsum-6-6" or the larger
+# "sshleifer/distilbart-cnn-12-6").
+_SUMMARIZER_MODEL = os.environ.get("HANGHIVE_SUMMARIZER_MODEL", "sshleifer/distilbart-cnn-6-6")
 _summarizer = None
 
+_SENT_RX = re.compile(r"(?<=[.!?])\s+")
+_WORD_RX = re.compile(r"\S+")
+
+# length bucketing for batched chunk summarization
+_BUCKET_SIZE = 8
+_BUCKET_MAX_RATIO = 1.3
+
 
 def _get_summarizer():
     global _summarizer
@@ -14,9 +30,16 @@ def _get_summarizer():
         return _summarizer
 
     try:
-        from transformers import pipeline
-
-        _summarizer = pipeline("summarization", model=_SUMMARIZER_MODEL, device=-1)
+        silence_transformers()
+        from transformers import AutoModelForSeq2SeqLM, AutoTokenizer
+
+        tokenizer = AutoTokenizer.from_pretrained(_SUMMARIZER_MODEL)
+        # prefer an ONNX Runtime export (already int8) when one is available
+        model = load_onnx_model(_SUMMARIZER_MODEL, "ORTModelForSeq2SeqLM")
+        if model is None:
+            model = AutoModelForSeq2SeqLM.from_pretrained(_SUMMARIZER_MODEL)
+            model = optimize_for_cpu(model.eval())
+        _summarizer = (tokenizer, model)
         return _summarizer
     except Exception as exc:
         _summarizer = None
@@ -24,12 +47,71 @@ def _get_summarizer():
         raise
 
 
+def warm_up_summarizer() -> bool:
+    """Initialize the summarization model lazily."""
+    try:
+        _get_summarizer()
+        return True
+    except Exception:
+        return False
+
+
+def _length_buckets(lengths: List[int]) -> List[List[int]]:
+    """Group indices by similar length so each batch carries little padding.
+
+    Indices are visited shortest-first; a bucket holds at most
+    `_BUCKET_SIZE` items whose longest/shortest ratio stays under
+    `_BUCKET_MAX_RATIO`.
+    """
+    buckets: List[List[int]] = []
+    for i in sorted(range(len(lengths)), key=lengths.__getitem__):
+        if buckets:
+            bucket = buckets[-1]
+            shortest = max(lengths[bucket[0]], 1)
+            if len(bucket) < _BUCKET_SIZE and lengths[i] / shortest < _BUCKET_MAX_RATIO:
+                bucket.append(i)
+                continue
+        buckets.append([i])
+    return buckets
+
+
+def _summarize_many(texts: List[str], max_length: int = 130, min_length: int = 20) -> List[str]:
+    """Summarize `texts` with one greedy `model.generate` call per length bucket.
+
+    Returns the summaries in the same order as `texts`.
+    """
+    tokenizer, model = _get_summarizer()
+    import torch
+
+    encoded = tokenizer(texts, truncation=True)
+    summaries = [""] * len(texts)
+    for bucket in _length_buckets([len(ids) for ids in encoded["input_ids"]]):
+        batch = tokenizer.pad(
+            {
+                "input_ids": [encoded["input_ids"][i] for i in bucket],
+                "attention_mask": [encoded["attention_mask"][i] for i in bucket],
+            },
+            return_tensors="pt",
+        )
+        with torch.inference_mode():
+            output_ids = model.generate(
+                **batch,
+                max_length=max_length,
+                min_length=min_length,
+                num_beams=1,
+                do_sample=False,
+            )
+        for i, summary in zip(bucket, tokenizer.batch_decode(output_ids, skip_special_tokens=True)):
+            summaries[i] = summary.strip()
+    return summaries
+
+
 def _chunk_text(text: str, max_chunk_chars: int = 2000) -> List[str]:
     """Split text into chunks that are safe for the summarization model."""
     if not text:
         return []
 
-    sentences = re.split(r'(?<=[.!?])\s+', text.strip())
+    sentences = _SENT_RX.split(text.strip())
     chunks: List[str] = []
     current = []
     curr_len = 0
@@ -47,7 +129,7 @@ def _chunk_text(text: str, max_chunk_chars: int = 2000) -> List[str]:
 
 
 def summarize_text(text: str, max_words: int = 60) -> str:
-    """Summarize `text` using HF summarization pipeline and return clean text.
+    """Summarize `text` with the HF summarization model and return clean text.
 
     - Limits the returned summary to `max_words` words.
     - Handles long input by chunking + combining.
@@ -57,24 +139,18 @@ def summarize_text(text: str, max_words: int = 60) -> str:
         return ""
 
     try:
-        summarizer = _get_summarizer()
-
         chunks = _chunk_text(text, max_chunk_chars=2000)
         if not chunks:
             return ""
 
-        partials = []
-        for chunk in chunks:
-            out = summarizer(chunk, max_length=130, min_length=20, do_sample=False, truncation=True)
-            if isinstance(out, list) and out:
-                partials.append(out[0].get("summary_text", "").strip())
+        # tokens beyond ~2 per allowed word would be truncated away anyway
+        max_tokens = min(130, max_words * 2)
+        partials = _summarize_many(chunks, max_length=max_tokens, min_length=min(20, max_tokens))
 
         combined = " ".join(partials)
-        # if there were multiple partials, compress once more
-        if len(partials) > 1:
-            out = summarizer(combined, max_length=130, min_length=30, do_sample=False, truncation=True)
-            if isinstance(out, list) and out:
-                combined = out[0].get("summary_text", "").strip()
+        # compress once more only if the partials are well over the word budget
+        if len(partials) > 1 and len(combined.split()) > max_words * 1.5:
+            combined = _summarize_many([combined], max_length=max_tokens, min_length=min(30, max_tokens))[0]
 
         # enforce max_words limit
         words = combined.split()
@@ -83,9 +159,9 @@ def summarize_text(text: str, max_words: int = 60) -> str:
 
         return combined.strip()
     except Exception:
-        logger.exception("summarizer pipeline failed, falling back to extractive summary")
+        logger.exception("summarizer model failed, falling back to extractive summary")
         # fallback: return first max_words words of the text
-        words = re.findall(r"\S+", text)
+        words = _WORD_RX.findall(text)
         if not words:
             return ""
         return " ".join(words[:max_words]).rstrip() + ("..." if len(words) > max_words else "")
@@ -11,22 +11,25 @@ Behaviour:
 """
 from __future__ import annotations
 
+import hashlib
+import io
 import os
+import re
+import select
 import sys
 import traceback
-from typing import Any, Dict, List
+from collections import OrderedDict, deque
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
 
 # Suppress ALL HuggingFace noise before any other app import
 os.environ["TOKENIZERS_PARALLELISM"] = "false"
 os.environ["TRANSFORMERS_NO_ADVISORY_WARNINGS"] = "1"
 os.environ["HF_HUB_DISABLE_PROGRESS_BARS"] = "1"
 os.environ["HF_HUB_DISABLE_TELEMETRY"] = "1"
-
-try:
-    import transformers
-    transformers.logging.set_verbosity_error()
-except Exception:
-    pass
+# transformers itself is only imported by the model loaders
+os.environ.setdefault("TRANSFORMERS_VERBOSITY", "error")
 
 import logging
 logging.getLogger("transformers").setLevel(logging.ERROR)
@@ -41,15 +44,21 @@ warnings.filterwarnings("ignore", message=".*max_new_tokens.*")
 
 # import with fallback so script is runnable both as a module and directly
 try:
-    from app.automod import detect_spam, check_toxicity, is_suspicious, is_unsafe
+    from app.automod import detect_spam, check_toxicity, check_toxicity_batch, is_suspicious, is_toxicity_final, is_unsafe
     from app.chatbot import generate_reply, warm_up_model, VALID_COMMUNITY_TYPES
-    from app.automod import warm_up_automod
-    from app.moderation import log_event
+    from app.automod import clear_caches as clear_automod_caches, warm_up_automod
+    from app.moderation import init_db, log_event
+    from app.utils import build_automaton
 except Exception:
-    from automod import detect_spam, check_toxicity, is_suspicious, is_unsafe, warm_up_automod  # type: ignore
+    from automod import detect_spam, check_toxicity, check_toxicity_batch, is_suspicious, is_unsafe, warm_up_automod  # type: ignore
+    from automod import clear_caches as clear_automod_caches, is_toxicity_final  # type: ignore
     from chatbot import generate_reply, warm_up_model, VALID_COMMUNITY_TYPES  # type: ignore
-    from moderation import log_event  # type: ignore
+    from moderation import init_db, log_event  # type: ignore
+    from utils import build_automaton  # type: ignore
 
+_VALID_CT = frozenset(VALID_COMMUNITY_TYPES)
+_VALID_CT_SORTED = tuple(sorted(VALID_COMMUNITY_TYPES))
+_EXIT_CMDS = frozenset({"exit", "quit", "q", ":q"})
 
 WELCOME = """
 ╔══════════════════════════════════════════════╗
@@ -59,130 +68,332 @@ WELCOME = """
 ╚══════════════════════════════════════════════╝
 """
 
+# Full tracebacks for reply errors only with HANGHIVE_DEBUG=1.
+_DEBUG = os.environ.get("HANGHIVE_DEBUG") == "1"
+
+# Bot lines are written straight to stdout rather than through print().
+_out_write = sys.stdout.write
+
+_BLOCK_MESSAGES = {
+    "spam": "Bot: ⛔ Spam detected — message blocked.\n\n",
+    "suspicious": "Bot: ⚠ Suspicious activity detected — message blocked.\n\n",
+    "unsafe": "Bot: 🚫 Unsafe content detected — please be respectful.\n\n",
+    "toxic": "Bot: 🚫 Toxic content detected — please be respectful.\n\n",
+}
+
+
+@dataclass(frozen=True)
+class AutomodVerdict:
+    """Input-only moderation results for one message (cacheable)."""
+
+    spam: bool
+    unsafe: bool = False
+    label: str = "clean"
+    score: float = 0.0
+
+
+# Bounded LRU of verdicts keyed by a truncated sha256 of the input.
+# Suspicion depends on the recent history, so it is never cached.
+MOD_CACHE_CAP = 1024
+_MOD_CACHE: "OrderedDict[bytes, AutomodVerdict]" = OrderedDict()
+
+# Filler turns ("ok", "thanks!") up to this length are moderated inline:
+# automod screens them lexically without the toxicity model, so the pool
+# hop would cost more than the checks themselves.
+def _fastpath_len(default: int = 8) -> int:
+    try:
+        value = int(os.environ.get("HANGHIVE_TOX_FASTPATH_LEN", default))
+    except ValueError:
+        return default
+    return value if value >= 1 else default
+
+
+_TOX_FASTPATH_LEN = _fastpath_len()
+_SAFE_SHORT = re.compile(rf"[a-z0-9 ?!.,']{{1,{_TOX_FASTPATH_LEN}}}")
+
+# Shared pool for the independent per-turn automod checks.
+_AUTOMOD_POOL = ThreadPoolExecutor(max_workers=3, thread_name_prefix="automod")
+
 
 def choose_community_type() -> str:
     """Prompt user to pick a community type; defaults to 'general' on bad input."""
-    options = sorted(VALID_COMMUNITY_TYPES)
+    options = _VALID_CT_SORTED
     print(f"  Available community types: {', '.join(options)}")
     choice = input("  Select community type (Enter = general): ").strip().lower()
     if not choice:
         return "general"
-    if choice not in VALID_COMMUNITY_TYPES:
+    if choice not in _VALID_CT:
         print(f'  ⚠ "{choice}" is not a valid type — defaulting to "general".')
         return "general"
     return choice
 
 
+_TOX_LABEL_INDICATORS = ("tox", "abuse", "offens", "insult", "threat", "hate")
+_TOX_LABEL_RE = re.compile("|".join(_TOX_LABEL_INDICATORS), re.IGNORECASE)
+
+# With pyahocorasick the label scan costs the same however many indicators
+# are listed; None means the regex above is used instead.
+_TOX_LABEL_AC = build_automaton(_TOX_LABEL_INDICATORS)
+
+
 def _is_model_toxic(label: str, score: float) -> bool:
-    if not label:
+    if not label or score < 0.6:
+        return False
+    if _TOX_LABEL_AC is not None:
+        return next(_TOX_LABEL_AC.iter(label.lower()), None) is not None
+    return _TOX_LABEL_RE.search(label) is not None
+
+
+def _cache_key(user_input: str) -> bytes:
+    return hashlib.sha256(user_input.encode("utf-8", "surrogatepass")).digest()[:16]
+
+
+def _cache_get(key: bytes) -> Optional[AutomodVerdict]:
+    verdict = _MOD_CACHE.get(key)
+    if verdict is not None:
+        _MOD_CACHE.move_to_end(key)
+    return verdict
+
+
+def _cache_put(key: bytes, verdict: AutomodVerdict) -> None:
+    _MOD_CACHE[key] = verdict
+    if len(_MOD_CACHE) > MOD_CACHE_CAP:
+        _MOD_CACHE.popitem(last=False)
+
+
+def _block_reason(verdict: AutomodVerdict, suspicious: bool) -> Optional[str]:
+    """Pick the reason to block, in spam > suspicious > unsafe > toxic order."""
+    if verdict.spam:
+        return "spam"
+    if suspicious:
+        return "suspicious"
+    if verdict.unsafe:
+        return "unsafe"
+    if _is_model_toxic(verdict.label, verdict.score):
+        return "toxic"
+    return None
+
+
+def _tox_bundle(user_input: str) -> Tuple[bool, str, float, bool]:
+    """One toxicity model pass plus the unsafe check that reuses it.
+
+    The last field says whether the result may be cached: heuristic
+    fallback verdicts are not, so they are redone once the model loads.
+    """
+    label, score = check_toxicity(user_input)
+    unsafe = is_unsafe(user_input, toxicity=(label, score))
+    return unsafe, label, score, is_toxicity_final(user_input)
+
+
+def _suspicious(user_input: str, recent: List[str]) -> bool:
+    try:
+        return is_suspicious(user_input, recent_messages=recent)
+    except Exception:
+        return False
+
+
+def _moderate(user_input: str, recent: List[str]) -> Tuple[Optional[str], AutomodVerdict]:
+    """Run automod for one turn and return ``(block reason or None, verdict)``.
+
+    A cached verdict only needs the live suspicion check, and short filler
+    turns are checked inline.  Otherwise spam, suspicion and the toxicity
+    bundle run concurrently; the first check that blocks wins and the rest
+    are cancelled.  A check that raises counts as not blocking.
+    """
+    key = _cache_key(user_input)
+    verdict = _cache_get(key)
+    if verdict is not None:
+        return _block_reason(verdict, _suspicious(user_input, recent)), verdict
+
+    if _SAFE_SHORT.fullmatch(user_input.lower()):
+        try:
+            spam = detect_spam(user_input)
+        except Exception:
+            spam = False
+        try:
+            unsafe, label, score, final = _tox_bundle(user_input)
+        except Exception:
+            unsafe, label, score, final = False, "clean", 0.0, False
+        verdict = AutomodVerdict(spam=spam, unsafe=unsafe, label=label, score=score)
+        if final:
+            _cache_put(key, verdict)
+        return _block_reason(verdict, _suspicious(user_input, recent)), verdict
+
+    futures = {
+        _AUTOMOD_POOL.submit(detect_spam, user_input): "spam",
+        _AUTOMOD_POOL.submit(is_suspicious, user_input, recent_messages=recent): "suspicious",
+        _AUTOMOD_POOL.submit(_tox_bundle, user_input): "toxicity",
+    }
+    spam: Optional[bool] = None
+    tox: Optional[Tuple[bool, str, float, bool]] = None
+    reason: Optional[str] = None
+    for fut in as_completed(futures):
+        kind = futures[fut]
+        try:
+            result = fut.result()
+        except Exception:
+            result = (False, "clean", 0.0, False) if kind == "toxicity" else False
+        if kind == "spam":
+            spam = result
+            reason = "spam" if result else None
+        elif kind == "suspicious":
+            reason = "suspicious" if result else None
+        else:
+            tox = result
+            unsafe, label, score, _ = result
+            reason = "unsafe" if unsafe else ("toxic" if _is_model_toxic(label, score) else None)
+        if reason:
+            for other in futures:
+                other.cancel()
+            break
+
+    unsafe, label, score, final = tox or (False, "clean", 0.0, False)
+    verdict = AutomodVerdict(spam=bool(spam), unsafe=unsafe, label=label, score=score)
+    # only cache once every input-only check has reported a final result
+    if spam is not None and final:
+        _cache_put(key, verdict)
+    return reason, verdict
+
+
+def _drain_stdin(max_lines: int = 8) -> List[str]:
+    """Collect up to *max_lines* further lines that are already waiting on stdin.
+
+    Never blocks: stops at the first line that isn't ready yet, at EOF, or
+    when stdin can't be polled (e.g. not a real file on Windows).
+    """
+    lines: List[str] = []
+    try:
+        while len(lines) < max_lines and select.select([sys.stdin], [], [], 0)[0]:
+            line = sys.stdin.readline()
+            if not line:
+                break
+            lines.append(line.rstrip("\n"))
+    except (OSError, ValueError, io.UnsupportedOperation):
+        pass
+    return lines
+
+
+def _prefetch_toxicity(lines: List[str]) -> None:
+    """Score a pasted/piped burst in one batched pass.
+
+    automod caches the model verdicts, so the per-turn checks that follow
+    hit that cache instead of running the model once per line.
+    """
+    texts = [t for t in (line.strip() for line in lines) if t and t.lower() not in _EXIT_CMDS]
+    if len(texts) > 1:
+        try:
+            check_toxicity_batch(texts)
+        except Exception:
+            pass
+
+
+def _warm_result(future: "Future[bool]") -> bool:
+    try:
+        return bool(future.result())
+    except Exception:
         return False
-    low = label.lower()
-    indicators = ("tox", "abuse", "offens", "insult", "threat", "hate")
-    return any(sub in low for sub in indicators) and score >= 0.6
 
 
 def main() -> None:
-    print(WELCOME)
+    _out_write(WELCOME + "\n")  # flushed by the community-type prompt
     community_type = choose_community_type()
-    print(f"  Using community type: {community_type}\n")
 
     # ---- warm up models ----------------------------------------------------
-    print("  Loading models …", end=" ", flush=True)
-    chat_ok = warm_up_model()
-    mod_ok = warm_up_automod()
+    # one write + flush, so the progress line is visible during the load
+    _out_write(f"  Using community type: {community_type}\n\n  Loading models … ")
+    sys.stdout.flush()
+    with ThreadPoolExecutor(max_workers=3, thread_name_prefix="warmup") as pool:
+        chat_future = pool.submit(warm_up_model)
+        mod_future = pool.submit(warm_up_automod)
+        # open the event store now so the first blocked turn only enqueues
+        db_future = pool.submit(init_db)
+    chat_ok = _warm_result(chat_future)
+    mod_ok = _warm_result(mod_future)
+    _warm_result(db_future)
     if chat_ok and mod_ok:
-        print("ready ✓\n")
+        status = "ready ✓"
     elif chat_ok:
-        print("chat ready ✓  (moderation model unavailable)\n")
+        status = "chat ready ✓  (moderation model unavailable)"
     else:
-        print("models unavailable — replies may be slow or fallback-only.\n")
+        status = "models unavailable — replies may be slow or fallback-only."
+    _out_write(status + "\n\n")
+    sys.stdout.flush()
 
     # ---- conversation loop -------------------------------------------------
-    history: List[Dict[str, Any]] = []
     MAX_HISTORY = 10  # keep last N turns
+    user_messages: "deque[str]" = deque(maxlen=MAX_HISTORY)
+    # each turn pre-rendered once, so the prompt history is a single join
+    history_text_parts: "deque[str]" = deque(maxlen=MAX_HISTORY)
+    # lines read ahead from a paste or pipe, handled one turn at a time
+    pending: "deque[str]" = deque()
 
     while True:
-        try:
-            user_input = input("You: ").strip()
-        except (EOFError, KeyboardInterrupt):
-            print("\nGoodbye!")
-            break
+        if pending:
+            user_input = pending.popleft()
+            _out_write("You: ")
+        else:
+            try:
+                user_input = input("You: ")
+            except (EOFError, KeyboardInterrupt):
+                print("\nGoodbye!")
+                break
+            burst = _drain_stdin()
+            if burst:
+                pending.extend(burst)
+                _prefetch_toxicity([user_input, *burst])
+        user_input = user_input.strip()
 
         if not user_input:
             continue
-        if user_input.lower() in ("exit", "quit"):
+        command = user_input.lower()
+        if command in _EXIT_CMDS:
             print("Goodbye!")
             break
+        if command == "/clearcache":
+            clear_automod_caches()
+            _MOD_CACHE.clear()
+            print("  Moderation caches cleared.\n")
+            continue
 
-        # 1) Spam
-        try:
-            if detect_spam(user_input):
-                print("Bot: ⛔ Spam detected — message blocked.\n")
-                try:
-                    log_event("blocked", None, user_input, reason="spam",
-                              metadata={"community_type": community_type})
-                except Exception:
-                    pass
-                continue
-        except Exception:
-            pass
-
-        # 2) Suspicious activity
-        try:
-            recent = [h["content"] for h in history if h.get("role") == "user"]
-            if is_suspicious(user_input, recent_messages=recent):
-                print("Bot: ⚠ Suspicious activity detected — message blocked.\n")
-                try:
-                    log_event("blocked", None, user_input, reason="suspicious",
-                              metadata={"community_type": community_type})
-                except Exception:
-                    pass
-                continue
-        except Exception:
-            pass
-
-        # 3) Toxicity / unsafe
-        try:
-            if is_unsafe(user_input):
-                print("Bot: 🚫 Unsafe content detected — please be respectful.\n")
-                try:
-                    log_event("blocked", None, user_input, reason="unsafe",
-                              metadata={"community_type": community_type})
-                except Exception:
-                    pass
-                continue
-            label, score = check_toxicity(user_input)
-            if _is_model_toxic(label, score):
-                print("Bot: 🚫 Toxic content detected — please be respectful.\n")
-                try:
-                    log_event("blocked", None, user_input, reason="toxic",
-                              metadata={"community_type": community_type,
-                                        "tox_label": label, "tox_score": score})
-                except Exception:
-                    pass
-                continue
-        except Exception:
-            pass  # allow generation even if automod fails
+        # 1) Spam / suspicious / unsafe / toxicity
+        # snapshot: a cancelled check may still be reading it on another
+        # thread (nothing to copy on the first turn)
+        recent = list(user_messages) if user_messages else []
+        reason, verdict = _moderate(user_input, recent)
+        if reason:
+            _out_write(_BLOCK_MESSAGES[reason])
+            sys.stdout.flush()
+            metadata: Dict[str, Any] = {"community_type": community_type}
+            if reason == "toxic":
+                metadata.update(tox_label=verdict.label, tox_score=verdict.score)
+            try:
+                log_event("blocked", None, user_input, reason=reason, metadata=metadata)
+            except Exception:
+                pass
+            continue
 
-        # 4) Generate reply
+        # 2) Generate reply
         try:
             reply = generate_reply(
                 user_input,
                 community_type=community_type,
-                context=history,
+                context_text="\n".join(history_text_parts),
             )
         except Exception as exc:
-            print("Bot: Error generating reply — try again later.\n")
-            traceback.print_exception(exc, file=sys.stderr)
+            _out_write("Bot: Error generating reply — try again later.\n\n")
+            sys.stdout.flush()
+            if _DEBUG:
+                traceback.print_exception(exc, file=sys.stderr)
+            else:
+                print(f"  [{type(exc).__name__}] {exc}", file=sys.stderr)
             continue
 
         # Maintain conversation history
-        history.append({"role": "user", "content": user_input})
-        history.append({"role": "assistant", "content": reply})
-        if len(history) > MAX_HISTORY * 2:
-            history = history[-(MAX_HISTORY * 2):]
+        user_messages.append(user_input)
+        history_text_parts.append(f"User: {user_input}\nAssistant: {reply}")
 
-        print(f"Bot: {reply}\n")
+        _out_write("Bot: " + reply + "\n\n")
+        sys.stdout.flush()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,120 @@
+"""Shared helpers for the HangHive AI model loaders and text matchers."""
+import importlib.util
+import logging
+import os
+from typing import Iterable
+
+logger = logging.getLogger(__name__)
+
+# Optional: pyahocorasick matches many literal words in one pass.
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
+
+# CPU inference precision for loaded models: "int8" (dynamic quantization
+# of Linear layers), "bf16", or "fp32" to leave weights untouched.
+_PRECISION_ENV = "HANGHIVE_CPU_PRECISION"
+
+
+def optimize_for_cpu(model):
+    """Return *model* prepared for CPU inference per ``HANGHIVE_CPU_PRECISION``.
+
+    Falls back to the unmodified model if the requested mode isn't supported.
+    """
+    precision = os.environ.get(_PRECISION_ENV, "int8").lower()
+    try:
+        import torch
+
+        if precision == "int8":
+            return torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+        if precision == "bf16" and hasattr(torch.cpu, "amp"):
+            return model.to(torch.bfloat16)
+    except Exception as exc:
+        logger.debug("%s optimization unavailable, using fp32: %s", precision, exc)
+    return model
+
+
+def build_automaton(words: Iterable[str]):
+    """Return an Aho-Corasick automaton over *words*, or None without pyahocorasick.
+
+    Each match's value is the word itself.
+    """
+    if ahocorasick is None:
+        return None
+    automaton = ahocorasick.Automaton()
+    for w in words:
+        automaton.add_word(w, w)
+    automaton.make_automaton()
+    return automaton
+
+
+_transformers_silenced = False
+
+
+def silence_transformers() -> None:
+    """Drop transformers' logging to errors, once, on the first model load.
+
+    Module imports only set ``TRANSFORMERS_VERBOSITY``; doing the rest here
+    keeps ``import transformers`` off the startup path when no model loads.
+    """
+    global _transformers_silenced
+    if _transformers_silenced or importlib.util.find_spec("transformers") is None:
+        return
+    try:
+        import transformers
+
+        transformers.logging.set_verbosity_error()
+    except Exception as exc:
+        logger.debug("could not silence transformers logging: %s", exc)
+    _transformers_silenced = True
+
+
+# Optional ONNX Runtime backend (pip install "optimum[onnxruntime]").
+# Quantized exports are looked up under HANGHIVE_ONNX_DIR/<org>--<name>;
+# HANGHIVE_ONNX=1 exports the hub checkpoint on the fly when none exists.
+_ONNX_DIR = os.environ.get(
+    "HANGHIVE_ONNX_DIR",
+    os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "models", "onnx")),
+)
+
+# `optimum-cli onnxruntime quantize` output files -> from_pretrained kwargs
+_QUANTIZED_FILES = {
+    "model_quantized.onnx": "file_name",
+    "encoder_model_quantized.onnx": "encoder_file_name",
+    "decoder_model_quantized.onnx": "decoder_file_name",
+    "decoder_with_past_model_quantized.onnx": "decoder_with_past_file_name",
+}
+
+
+def onnx_model_dir(model_id: str) -> str:
+    """Local directory checked for a pre-built ONNX export of *model_id*."""
+    return os.path.join(_ONNX_DIR, model_id.replace("/", "--"))
+
+
+def load_onnx_model(model_id: str, ort_class: str):
+    """Load *model_id* as an ``optimum.onnxruntime`` *ort_class*, or return None.
+
+    Returns None when no local export exists and on-the-fly export is off,
+    or when optimum / onnxruntime aren't installed.
+    """
+    local_dir = onnx_model_dir(model_id)
+    has_local = os.path.isdir(local_dir)
+    if not has_local and os.environ.get("HANGHIVE_ONNX") != "1":
+        return None
+
+    try:
+        import optimum.onnxruntime as ort
+
+        cls = getattr(ort, ort_class)
+        if has_local:
+            files = {
+                kw: name
+                for name, kw in _QUANTIZED_FILES.items()
+                if os.path.exists(os.path.join(local_dir, name))
+            }
+            return cls.from_pretrained(local_dir, provider="CPUExecutionProvider", **files)
+        return cls.from_pretrained(model_id, export=True, provider="CPUExecutionProvider")
+    except Exception as exc:
+        logger.debug("onnxruntime backend unavailable for %s: %s", model_id, exc)
+        return None
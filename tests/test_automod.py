@@ -11,6 +11,11 @@ def test_is_suspicious_repeats():
     assert automod.is_suspicious("hi", recent_messages=recent)
 
 
+def test_is_suspicious_first_turn_still_checks_density():
+    assert automod.is_suspicious("@a @b @c @d @e hello", recent_messages=[])
+    assert not automod.is_suspicious("hi", recent_messages=["hi", "hi"])
+
+
 def test_is_unsafe_keyword():
     assert automod.is_unsafe("I will kill you")
 
@@ -18,3 +23,88 @@ def test_is_unsafe_keyword():
 def test_check_toxicity_heuristic():
     label, score = automod.check_toxicity("You are an idiot")
     assert label is not None
+
+
+def test_check_toxicity_batch_keeps_order():
+    results = automod.check_toxicity_batch(["You are an idiot", "", "have a nice day"])
+    assert len(results) == 3
+    assert results[1] == ("clean", 0.0)
+
+
+def test_keyword_checks_respect_word_boundaries():
+    assert automod.is_toxic("what an idiot")
+    assert not automod.is_toxic("great skill shown there")
+    assert automod._find_unsafe_phrase("i want to end my life") == "end my life"
+    assert automod._find_unsafe_phrase("a denuded hillside") is None
+
+
+def test_is_spam_repeated_lines():
+    assert automod.is_spam("hey\nhey\nhey")
+    assert not automod.is_spam("hey\nhello\nhey")
+
+
+def test_short_clean_messages_skip_the_model(monkeypatch):
+    calls = []
+
+    def detector():
+        calls.append(1)
+        raise RuntimeError("model unavailable")
+
+    monkeypatch.setattr(automod, "_get_toxicity_detector", detector)
+    assert automod.check_toxicity("thanks, see you soon") == ("clean", 0.0)
+    assert not automod.is_unsafe("thanks, see you soon")
+    assert calls == []
+
+    automod.check_toxicity("this message is long enough that it has to go through the model")
+    assert calls == [1]
+
+
+def test_verdict_cache_evicts_least_recently_used():
+    cache = automod._VerdictCache(maxsize=2)
+    cache.put(b"a", True)
+    cache.put(b"b", False)
+    assert cache.get(b"a") is True
+    cache.put(b"c", True)
+    assert cache.get(b"b") is None
+    assert cache.get(b"a") is True
+    assert cache.get(b"c") is True
+
+
+def test_clear_caches_forgets_verdicts():
+    key = automod._digest("cached verdict")
+    automod._toxicity_cache.put(key, ("toxic", 0.9))
+    automod.clear_caches()
+    assert automod._toxicity_cache.get(key) is None
+
+
+def test_is_toxic_fallback_without_model(monkeypatch):
+    def detector():
+        raise RuntimeError("model unavailable")
+
+    monkeypatch.setattr(automod, "_get_toxicity_detector", detector)
+    long_clean = "this is a perfectly friendly message that is long enough for the model"
+    assert not automod.is_toxic(long_clean)
+    assert automod.is_toxic(long_clean + " but you are an idiot")
+
+
+def test_long_single_character_runs_scan_in_linear_time():
+    import time
+
+    start = time.perf_counter()
+    assert automod.is_spam("a" * 20000)
+    assert not automod.is_suspicious("see log below" + " " * 15000, recent_messages=[])
+    assert time.perf_counter() - start < 1.0
+
+
+def test_is_toxicity_final_excludes_heuristic_fallback(monkeypatch):
+    def no_model():
+        raise RuntimeError("model unavailable")
+
+    monkeypatch.setattr(automod, "_get_toxicity_detector", no_model)
+    assert automod.is_toxicity_final("hello there")
+    text = "a long message that needs the model to score it properly"
+    automod.check_toxicity(text)
+    assert not automod.is_toxicity_final(text)
+    automod._toxicity_cache.put(automod._digest(text), ("clean", 0.01))
+    assert automod.is_toxicity_final(text)
+    automod.clear_caches()
@@ -0,0 +1,46 @@
+import asyncio
+
+from app.batcher import MicroBatcher
+
+
+def test_concurrent_submits_share_one_batch():
+    calls = []
+
+    def double(items):
+        calls.append(list(items))
+        return [i * 2 for i in items]
+
+    async def run():
+        batcher = MicroBatcher(double, max_batch=8, max_delay_ms=20)
+        results = await asyncio.gather(*(batcher.submit(i) for i in range(5)))
+        await batcher.stop()
+        return results
+
+    assert asyncio.run(run()) == [0, 2, 4, 6, 8]
+    assert calls == [[0, 1, 2, 3, 4]]
+
+
+def test_batch_errors_reach_every_caller():
+    def boom(items):
+        raise ValueError("model down")
+
+    async def run():
+        batcher = MicroBatcher(boom, max_delay_ms=1)
+        results = await asyncio.gather(batcher.submit("a"), batcher.submit("b"), return_exceptions=True)
+        await batcher.stop()
+        return results
+
+    results = asyncio.run(run())
+    assert all(isinstance(r, ValueError) for r in results)
+
+
+def test_stop_during_delay_fails_held_items():
+    async def run():
+        batcher = MicroBatcher(lambda items: items, max_delay_ms=1000)
+        pending = asyncio.ensure_future(batcher.submit("a"))
+        await asyncio.sleep(0.05)  # consumer now holds "a" in its delay window
+        await batcher.stop()
+        return await asyncio.wait_for(asyncio.gather(pending, return_exceptions=True), timeout=2)
+
+    (result,) = asyncio.run(run())
+    assert isinstance(result, RuntimeError)
@@ -1,13 +1,35 @@
 from app import chatbot
 
 
-class DummyGen:
-    def __call__(self, prompt, **kwargs):
-        return [{"generated_text": prompt + " Hello from dummy."}]
+def dummy_generate(prompts):
+    return [" Hello from dummy."] * len(prompts)
 
 
 def test_generate_reply_with_context(monkeypatch):
-    monkeypatch.setattr(chatbot, "_get_text_generator", lambda: DummyGen())
+    monkeypatch.setattr(chatbot, "_generate_texts", dummy_generate)
     reply = chatbot.generate_reply("@AI how are you?", community_type="general", context=["previous message"])
     assert "Hello from dummy" in reply
-    assert isinstance(reply, str)
\ No newline at end of file
+    assert isinstance(reply, str)
+
+
+def test_generate_replies_keeps_order(monkeypatch):
+    monkeypatch.setattr(chatbot, "_generate_texts", lambda prompts: [f" reply {i}." for i in range(len(prompts))])
+    replies = chatbot.generate_replies([("@AI", "general", None), ("first", "gaming", None), ("second", "study", [])])
+    assert replies == ["Hi — how can I help?", "reply 0.", "reply 1."]
+
+
+def test_trim_repetition_stops_at_first_repeat():
+    text = "Hi there. I can help. Hi there. I can help."
+    assert chatbot._trim_repetition(text) == "Hi there. I can help."
+
+
+def test_clean_reply_cuts_at_turn_marker():
+    raw = " Assistant: Sure, run the installer.\nUser: thanks\nAssistant: np"
+    assert chatbot._clean_reply(raw) == "Sure, run the installer."
+
+
+def test_prompt_tail_from_context_text_matches_context():
+    context = [{"role": "user", "content": "hi"}, {"role": "assistant", "content": "hello!"}]
+    rendered = "User: hi\nAssistant: hello!"
+    assert chatbot._build_prompt_tail("next", rendered) == chatbot._build_prompt_tail("next", context)
+    assert chatbot._build_prompt_tail("next", "") == chatbot._build_prompt_tail("next", None)
@@ -2,7 +2,22 @@ from app import moderation
 
 
 def test_log_and_get_event():
-    eid = moderation.log_event("test", "user123", "hello", reason="unit-test", metadata={"a":1})
+    eid = moderation.log_event("test", "user123", "hello", reason="unit-test", metadata={"a":1}).result(timeout=5)
     assert isinstance(eid, int)
     events = moderation.get_events(limit=5)
     assert any(e["id"] == eid for e in events)
+
+
+def test_get_event_by_id():
+    eid = moderation.log_event("test", "user456", "lookup", reason="unit-test").result(timeout=5)
+    assert moderation.get_event(eid)["message"] == "lookup"
+    assert moderation.get_event(-1) is None
+
+
+def test_unserializable_metadata_raises_to_caller():
+    import pytest
+
+    with pytest.raises(TypeError):
+        moderation.log_event("test", None, "bad", metadata={"o": object()})
+    eid = moderation.log_event("test", None, "after bad metadata").result(timeout=5)
+    assert moderation.get_event(eid)["message"] == "after bad metadata"
@@ -9,4 +9,24 @@ def test_summarize_text_word_limit():
 
 
 def test_summarizer_fallback_for_empty():
-    assert summarizer.summarize_text("", max_words=10) == ""
\ No newline at end of file
+    assert summarizer.summarize_text("", max_words=10) == ""
+
+
+def test_length_buckets_group_similar_lengths():
+    lengths = [100, 10, 12, 95, 11, 300]
+    buckets = summarizer._length_buckets(lengths)
+    assert buckets == [[1, 4, 2], [3, 0], [5]]
+
+
+def test_second_pass_skipped_when_partials_fit(monkeypatch):
+    calls = []
+
+    def fake_summarize_many(texts, max_length=130, min_length=20):
+        calls.append((len(texts), max_length))
+        return ["short partial summary."] * len(texts)
+
+    monkeypatch.setattr(summarizer, "_summarize_many", fake_summarize_many)
+    text = ("This is a fairly long sentence about the project. " * 60).strip()
+    out = summarizer.summarize_text(text, max_words=40)
+    assert calls == [(2, 80)]
+    assert out.startswith("short partial summary.")
@@ -0,0 +1,84 @@
+import pytest
+
+from app import terminal_chatbot
+
+
+@pytest.fixture(autouse=True)
+def _fresh_caches(monkeypatch):
+    monkeypatch.setattr(terminal_chatbot, "_MOD_CACHE", terminal_chatbot.OrderedDict())
+
+
+def test_moderate_caches_input_only_checks(monkeypatch):
+    calls = []
+
+    def fake_check_toxicity(text):
+        calls.append(text)
+        return ("toxic", 0.3)
+
+    monkeypatch.setattr(terminal_chatbot, "check_toxicity", fake_check_toxicity)
+    monkeypatch.setattr(terminal_chatbot, "is_toxicity_final", lambda text: True)
+    first = terminal_chatbot._moderate("some repeated but harmless message", [])
+    second = terminal_chatbot._moderate("some repeated but harmless message", [])
+    assert first == second == (None, terminal_chatbot.AutomodVerdict(False, False, "toxic", 0.3))
+    assert calls == ["some repeated but harmless message"]
+
+
+def test_moderate_does_not_cache_fallback_toxicity(monkeypatch):
+    calls = []
+    monkeypatch.setattr(terminal_chatbot, "check_toxicity", lambda text: calls.append(text) or ("clean", 0.0))
+    monkeypatch.setattr(terminal_chatbot, "is_toxicity_final", lambda text: False)
+    terminal_chatbot._moderate("scored by the heuristic fallback", [])
+    terminal_chatbot._moderate("scored by the heuristic fallback", [])
+    assert len(calls) == 2
+    assert not terminal_chatbot._MOD_CACHE
+
+def test_moderate_reports_blocking_check(monkeypatch):
+    monkeypatch.setattr(terminal_chatbot, "check_toxicity", lambda text: ("toxic", 0.9))
+    reason, verdict = terminal_chatbot._moderate("a message the model dislikes", [])
+    assert reason == "toxic"
+    assert verdict.score == 0.9
+
+
+def test_block_reason_priority():
+    verdict = terminal_chatbot.AutomodVerdict(spam=False, unsafe=False, label="toxic", score=0.9)
+    assert terminal_chatbot._block_reason(verdict, suspicious=False) == "toxic"
+    assert terminal_chatbot._block_reason(verdict, suspicious=True) == "suspicious"
+    assert terminal_chatbot._block_reason(terminal_chatbot.AutomodVerdict(spam=True), suspicious=True) == "spam"
+
+
+def test_is_model_toxic_label_match():
+    assert terminal_chatbot._is_model_toxic("TOXIC", 0.7)
+    assert terminal_chatbot._is_model_toxic("severe_insult", 0.6)
+    assert not terminal_chatbot._is_model_toxic("toxic", 0.5)
+    assert not terminal_chatbot._is_model_toxic("clean", 0.99)
+    assert not terminal_chatbot._is_model_toxic("", 0.99)
+
+
+def test_moderate_short_filler_skips_pool(monkeypatch):
+    class NoPool:
+        def submit(self, *args, **kwargs):
+            raise AssertionError("short filler should be checked inline")
+
+    monkeypatch.setattr(terminal_chatbot, "_AUTOMOD_POOL", NoPool())
+    reason, verdict = terminal_chatbot._moderate("thanks!", [])
+    assert reason is None
+    assert verdict == terminal_chatbot.AutomodVerdict(spam=False)
+
+
+def test_drain_stdin_reads_waiting_lines(monkeypatch):
+    import os
+
+    read_fd, write_fd = os.pipe()
+    os.write(write_fd, b"one\ntwo\nthree\n")
+    os.close(write_fd)
+    with os.fdopen(read_fd) as stdin:
+        monkeypatch.setattr(terminal_chatbot.sys, "stdin", stdin)
+        assert terminal_chatbot._drain_stdin(max_lines=2) == ["one", "two"]
+        assert terminal_chatbot._drain_stdin() == ["three"]
+
+
+def test_prefetch_toxicity_batches_burst(monkeypatch):
+    batches = []
+    monkeypatch.setattr(terminal_chatbot, "check_toxicity_batch", batches.append)
+    terminal_chatbot._prefetch_toxicity(["first line ", "", "second line", "exit"])
+    assert batches == [["first line", "second line"]]